@@ -4,11 +4,20 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, TextAreaField, SelectField, IntegerField, SubmitField
 from wtforms.validators import DataRequired, Email, Length, NumberRange
 from datetime import datetime
+from array import array
+import gzip
+import hashlib
+import json
 import os
+import struct
+import sys
 import uuid
 
 # Import database models
-from db import db, User, Product, Location, ProductMovement
+from db import (db, User, Product, Location, ProductMovement, get_stock_matrix, get_table_versions,
+                delete_products, delete_locations, delete_movements, void_movements,
+                MOVEMENT_ID_LENGTH, VOID_PREFIX)
+from assets import StaticAssets
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-secret-key-for-testing-12345'
@@ -16,12 +25,15 @@ app.config['SESSION_COOKIE_SECURE'] = False
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['WTF_CSRF_ENABLED'] = False  # Disable CSRF globally for testing
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///inventory.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///inventory.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize database with app
 db.init_app(app)
 
+# Serve static files under content-hashed names with immutable caching
+assets = StaticAssets(app)
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -279,8 +291,8 @@ def edit_product(product_id):
 @app.route('/products/delete/<product_id>')
 @login_required
 def delete_product(product_id):
-    product = Product.query.get_or_404(product_id)
-    db.session.delete(product)
+    Product.query.get_or_404(product_id)
+    delete_products([product_id])
     db.session.commit()
     flash('Product deleted successfully!', 'success')
     return redirect(url_for('products'))
@@ -329,8 +341,8 @@ def edit_location(location_id):
 @app.route('/locations/delete/<location_id>')
 @login_required
 def delete_location(location_id):
-    location = Location.query.get_or_404(location_id)
-    db.session.delete(location)
+    Location.query.get_or_404(location_id)
+    delete_locations([location_id])
     db.session.commit()
     flash('Location deleted successfully!', 'success')
     return redirect(url_for('locations'))
@@ -356,6 +368,14 @@ def add_movement():
             flash('Movement ID already exists!', 'error')
             return redirect(url_for('add_movement'))
         
+        if movement_id.upper().startswith(VOID_PREFIX):
+            flash(f'Movement IDs starting with {VOID_PREFIX} are reserved for voided movements!', 'error')
+            return redirect(url_for('add_movement'))
+        
+        if len(movement_id) > MOVEMENT_ID_LENGTH:
+            flash(f'Movement ID must be at most {MOVEMENT_ID_LENGTH} characters!', 'error')
+            return redirect(url_for('add_movement'))
+        
         if not from_location and not to_location:
             flash('Either from_location or to_location must be specified!', 'error')
             return redirect(url_for('add_movement'))
@@ -398,6 +418,10 @@ def add_movement():
 def edit_movement(movement_id):
     movement = ProductMovement.query.get_or_404(movement_id)
     
+    if movement.is_part_of_void():
+        flash('Voided movements and their VOID- reversals cannot be edited!', 'error')
+        return redirect(url_for('movements'))
+    
     if request.method == 'POST':
         movement.from_location = request.form['from_location'] if request.form['from_location'] else None
         movement.to_location = request.form['to_location'] if request.form['to_location'] else None
@@ -423,8 +447,8 @@ def edit_movement(movement_id):
 @app.route('/movements/delete/<movement_id>')
 @login_required
 def delete_movement(movement_id):
-    movement = ProductMovement.query.get_or_404(movement_id)
-    db.session.delete(movement)
+    ProductMovement.query.get_or_404(movement_id)
+    delete_movements([movement_id])
     db.session.commit()
     flash('Movement deleted successfully!', 'success')
     return redirect(url_for('movements'))
@@ -465,6 +489,278 @@ def balance():
     
     return render_template('balance.html', balance_data=balance_data)
 
+# Dense matrices above this many cells must be requested as CSR instead
+MATRIX_DENSE_MAX_CELLS = 1000000
+
+def build_balance_matrix(product_ids, location_ids, cells, layout):
+    """Lay out aggregated (product_id, location_id, qty) cells as integer arrays"""
+    product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+    location_index = {location_id: j for j, location_id in enumerate(location_ids)}
+    
+    if layout == 'csr':
+        # Cells arrive ordered by product, so row pointers can be built in one pass
+        indptr = [0] * (len(product_ids) + 1)
+        indices = []
+        data = []
+        for product_id, location_id, qty in cells:
+            if not qty or product_id not in product_index or location_id not in location_index:
+                continue
+            indptr[product_index[product_id] + 1] += 1
+            indices.append(location_index[location_id])
+            data.append(qty)
+        for i in range(len(product_ids)):
+            indptr[i + 1] += indptr[i]
+        return {'indptr': indptr, 'indices': indices, 'data': data}
+    
+    width = len(location_ids)
+    data = [0] * (len(product_ids) * width)
+    for product_id, location_id, qty in cells:
+        if product_id in product_index and location_id in location_index:
+            data[product_index[product_id] * width + location_index[location_id]] = qty
+    return {'data': data}
+
+def _pack_ints(values):
+    """Pack integers as little-endian binary using the narrowest dtype that fits"""
+    low, high = (min(values), max(values)) if values else (0, 0)
+    for typecode, dtype, bits in (('h', '<i2', 16), ('i', '<i4', 32), ('q', '<i8', 64)):
+        if -(1 << (bits - 1)) <= low and high < (1 << (bits - 1)):
+            break
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes(), dtype
+
+def encode_balance_matrix(header, arrays, encoding):
+    """Serialize a balance matrix, returning (body, mimetype).
+
+    The binary encoding is a 4-byte little-endian header length, a UTF-8
+    JSON header with the ID vectors and an 'arrays' list of
+    {name, dtype, length}, then the raw array bytes in that order.
+    """
+    if encoding == 'json':
+        payload = dict(header, **arrays)
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8'), 'application/json'
+    
+    chunks = []
+    header = dict(header, arrays=[])
+    for name, values in arrays.items():
+        chunk, dtype = _pack_ints(values)
+        header['arrays'].append({'name': name, 'dtype': dtype, 'length': len(values)})
+        chunks.append(chunk)
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return struct.pack('<I', len(header_bytes)) + header_bytes + b''.join(chunks), 'application/octet-stream'
+
+@app.route('/api/balance/matrix')
+@login_required
+def balance_matrix():
+    """Product x location stock matrix for planning tools.
+
+    Query parameters:
+      layout   - 'csr' (default) or 'dense' (up to MATRIX_DENSE_MAX_CELLS cells)
+      encoding - 'json' (default) or 'binary' (application/octet-stream, see encode_balance_matrix)
+    Responses are gzip-compressed when the client accepts it.
+    """
+    layout = request.args.get('layout', 'csr')
+    encoding = request.args.get('encoding', 'json')
+    if layout not in ('csr', 'dense') or encoding not in ('json', 'binary'):
+        return jsonify({'error': 'layout must be csr or dense, encoding must be json or binary'}), 400
+    
+    # Check the dense size with two cheap counts before running the cell aggregate
+    if layout == 'dense' and Product.query.count() * Location.query.count() > MATRIX_DENSE_MAX_CELLS:
+        return jsonify({'error': f'Dense layout is limited to {MATRIX_DENSE_MAX_CELLS} cells; use layout=csr'}), 400
+    
+    product_ids, location_ids, cells = get_stock_matrix()
+    header = {
+        'products': product_ids,
+        'locations': location_ids,
+        'shape': [len(product_ids), len(location_ids)],
+        'layout': layout
+    }
+    arrays = build_balance_matrix(product_ids, location_ids, cells, layout)
+    body, mimetype = encode_balance_matrix(header, arrays, encoding)
+    
+    response = app.response_class(body, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    if request.accept_encodings['gzip'] > 0:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# JSON read API
+API_MAX_PER_PAGE = 1000
+
+API_FIELDS = {
+    'products': {
+        'product_id': Product.product_id,
+        'name': Product.name,
+        'description': Product.description,
+        'total_qty': Product.total_qty
+    },
+    'locations': {
+        'location_id': Location.location_id,
+        'name': Location.name,
+        'address': Location.address
+    },
+    'movements': {
+        'movement_id': ProductMovement.movement_id,
+        'timestamp': ProductMovement.timestamp,
+        'from_location': ProductMovement.from_location,
+        'to_location': ProductMovement.to_location,
+        'product_id': ProductMovement.product_id,
+        'qty': ProductMovement.qty
+    }
+}
+
+class ApiError(Exception):
+    """Client error in an API request, reported as a JSON body"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+def _api_etag(*table_names):
+    """Strong ETag from the change counters of the tables a response depends on"""
+    versions = get_table_versions(*table_names)
+    key = '|'.join(f'{name}:{versions[name]}' for name in table_names) + '|' + request.full_path
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def _api_fields(available):
+    """Parse the ?fields= parameter against the available field names"""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    if not fields:
+        raise ApiError(f"fields must name at least one of: {', '.join(available)}")
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+def _api_page():
+    """Parse ?page= and ?per_page= into (page, per_page)"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    if page < 1 or not 1 <= per_page <= API_MAX_PER_PAGE:
+        raise ApiError(f'page must be >= 1 and per_page between 1 and {API_MAX_PER_PAGE}')
+    return page, per_page
+
+def _api_response(etag, build_payload):
+    """Answer 304 if the client's ETag still matches, otherwise build the JSON body"""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _api_listing(available, source, fields, page, per_page, order_by):
+    """Query one page of the selected columns from source, plus its total row count"""
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(source)
+    ).scalar()
+    rows = db.session.execute(
+        db.select(*(available[field] for field in fields))
+        .order_by(*order_by)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    items = []
+    for row in rows:
+        item = dict(zip(fields, row))
+        if isinstance(item.get('timestamp'), datetime):
+            item['timestamp'] = item['timestamp'].isoformat()
+        items.append(item)
+    return {'items': items, 'page': page, 'per_page': per_page, 'total': total}
+
+def _api_collection(resource, model, tables, *order_by):
+    """Paginated listing of one table with field selection"""
+    available = API_FIELDS[resource]
+    fields = _api_fields(available)
+    page, per_page = _api_page()
+    
+    def build_payload():
+        return _api_listing(available, model, fields, page, per_page, order_by)
+    
+    return _api_response(_api_etag(*tables), build_payload)
+
+@app.route('/api/products')
+@login_required
+def api_products():
+    return _api_collection('products', Product, ['product'], Product.product_id)
+
+@app.route('/api/locations')
+@login_required
+def api_locations():
+    return _api_collection('locations', Location, ['location'], Location.location_id)
+
+@app.route('/api/movements')
+@login_required
+def api_movements():
+    return _api_collection('movements', ProductMovement, ['product_movement'],
+                           ProductMovement.timestamp.desc(), ProductMovement.movement_id)
+
+@app.route('/api/locations/<location_id>/stock')
+@login_required
+def api_location_stock(location_id):
+    fields = _api_fields(['product_id', 'qty'])
+    page, per_page = _api_page()
+    
+    # Primary-key read on location only, so If-None-Match: * cannot turn a 404 into a 304
+    location = Location.query.get(location_id)
+    if location is None:
+        raise ApiError(f'Location {location_id} not found', 404)
+    
+    def build_payload():
+        stock = location.get_stock_query().subquery()
+        available = {'product_id': stock.c.product_id, 'qty': stock.c.qty}
+        payload = _api_listing(available, stock, fields, page, per_page, (stock.c.product_id,))
+        payload['location_id'] = location_id
+        return payload
+    
+    return _api_response(_api_etag('location', 'product_movement'), build_payload)
+
+def _api_ids():
+    """Read the {"ids": [...]} list from a bulk request body"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+        raise ApiError('Request body must be JSON of the form {"ids": ["ID-1", ...]}')
+    return ids
+
+@app.route('/api/products/bulk-delete', methods=['POST'])
+@login_required
+def api_bulk_delete_products():
+    deleted = delete_products(_api_ids())
+    db.session.commit()
+    return jsonify({'deleted': deleted})
+
+@app.route('/api/locations/bulk-delete', methods=['POST'])
+@login_required
+def api_bulk_delete_locations():
+    deleted = delete_locations(_api_ids())
+    db.session.commit()
+    return jsonify({'deleted': deleted})
+
+@app.route('/api/movements/bulk-delete', methods=['POST'])
+@login_required
+def api_bulk_delete_movements():
+    deleted = delete_movements(_api_ids())
+    db.session.commit()
+    return jsonify({'deleted': deleted})
+
+@app.route('/api/movements/bulk-void', methods=['POST'])
+@login_required
+def api_bulk_void_movements():
+    voided, skipped = void_movements(_api_ids())
+    db.session.commit()
+    return jsonify({'voided': voided, 'skipped': skipped})
+
 def init_sample_data():
     """Initialize sample data if database is empty"""
     
@@ -0,0 +1,117 @@
+"""
+Fingerprinted static assets for Inventory Management System
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+import brotli
+from flask import request
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class StaticAsset:
+    """A static file with its content hash and precompressed variants"""
+
+    def __init__(self, filename, path):
+        self.filename = filename
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        self.digest = hashlib.sha256(content).hexdigest()[:12]
+        root, ext = os.path.splitext(filename)
+        self.hashed_filename = f'{root}.{self.digest}{ext}'
+        self.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        # Encoded bodies keyed by Content-Encoding; None is the identity body
+        self.variants = {None: content}
+        if self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            self.variants['gzip'] = gzip.compress(content, compresslevel=9, mtime=0)
+            self.variants['br'] = brotli.compress(content, quality=11)
+
+    def is_stale(self):
+        """Check whether the file on disk changed since it was hashed"""
+        try:
+            return os.stat(self.path).st_mtime != self.mtime
+        except OSError:
+            return True
+
+
+class StaticAssets:
+    """Serve static files under content-hashed names with long-lived caching.
+
+    Files are hashed and compressed in memory when the app starts, so no
+    build step is needed. url_for('static', filename=...) is rewritten to
+    the hashed name, which is served with Cache-Control: immutable and a
+    brotli or gzip body negotiated from Accept-Encoding. Unhashed names
+    still fall through to Flask's default static handler.
+    """
+
+    def __init__(self, app=None):
+        self.assets = {}
+        self.hashed = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._default_view = app.view_functions['static']
+        app.view_functions['static'] = self.send_asset
+        app.url_defaults(self.fingerprint_url)
+
+        for dirpath, _, filenames in os.walk(app.static_folder):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                filename = os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+                self._load(filename, path)
+
+    def _load(self, filename, path):
+        asset = StaticAsset(filename, path)
+        old = self.assets.get(filename)
+        if old is not None:
+            self.hashed.pop(old.hashed_filename, None)
+        self.assets[filename] = asset
+        self.hashed[asset.hashed_filename] = asset
+        return asset
+
+    def get(self, filename):
+        """Look up an asset, re-hashing it in debug mode if it was edited"""
+        asset = self.assets.get(filename)
+        if asset is not None and self.app.debug and asset.is_stale():
+            if not os.path.exists(asset.path):
+                return None
+            asset = self._load(filename, asset.path)
+        return asset
+
+    def fingerprint_url(self, endpoint, values):
+        """url_defaults hook that swaps static filenames for hashed ones"""
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        asset = self.get(values['filename'])
+        if asset is not None:
+            values['filename'] = asset.hashed_filename
+
+    def send_asset(self, filename):
+        asset = self.hashed.get(filename)
+        if asset is None:
+            return self._default_view(filename=filename)
+
+        encoding = None
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                break
+
+        response = self.app.response_class(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f'{asset.digest}-{encoding or "identity"}')
+        return response.make_conditional(request)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Benchmark the balance matrix endpoint against the HTML balance report"""
+
+import argparse
+import gzip
+import os
+import random
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--locations', type=int, default=100)
+    parser.add_argument('--movements', type=int, default=200000)
+    parser.add_argument('--skip-html', action='store_true',
+                        help='skip /balance, which issues 2 queries per product-location pair')
+    parser.add_argument('--deletes', action='store_true',
+                        help='also time the set-based void/delete helpers after the matrix benchmark')
+    return parser.parse_args()
+
+
+def seed(db, Product, Location, ProductMovement, args):
+    """Bulk-insert synthetic products, locations and movements"""
+    rng = random.Random(42)
+    location_ids = [f'LOC-{j:05d}' for j in range(args.locations)]
+    db.session.execute(db.insert(Product), [
+        {'product_id': f'P-{i:06d}', 'name': f'Product {i}', 'total_qty': 0}
+        for i in range(args.products)
+    ])
+    db.session.execute(db.insert(Location), [
+        {'location_id': location_id, 'name': location_id} for location_id in location_ids
+    ])
+    movements = []
+    for n in range(args.movements):
+        from_location, to_location = rng.sample(location_ids + [None], 2)
+        if from_location is None and to_location is None:
+            to_location = location_ids[0]
+        movements.append({
+            'movement_id': f'M-{n:08d}',
+            'from_location': from_location,
+            'to_location': to_location,
+            'product_id': f'P-{rng.randrange(args.products):06d}',
+            'qty': rng.randint(1, 50)
+        })
+    db.session.execute(db.insert(ProductMovement), movements)
+    db.session.commit()
+
+
+def time_phases(app, get_stock_matrix, build_balance_matrix, encode_balance_matrix):
+    """Time the aggregate query, array layout, serialization and gzip separately"""
+    with app.app_context():
+        start = time.perf_counter()
+        product_ids, location_ids, cells = get_stock_matrix()
+        print(f'{"aggregate query":<28} {len(cells):>12,d} cells {time.perf_counter() - start:>9.3f} s')
+
+        header = {
+            'products': product_ids,
+            'locations': location_ids,
+            'shape': [len(product_ids), len(location_ids)],
+            'layout': 'csr'
+        }
+        start = time.perf_counter()
+        arrays = build_balance_matrix(product_ids, location_ids, cells, 'csr')
+        print(f'{"csr layout":<28} {"":>18} {time.perf_counter() - start:>9.3f} s')
+
+        for encoding in ('json', 'binary'):
+            start = time.perf_counter()
+            body, _ = encode_balance_matrix(header, arrays, encoding)
+            serialize = time.perf_counter() - start
+            start = time.perf_counter()
+            compressed = gzip.compress(body, compresslevel=6)
+            compress = time.perf_counter() - start
+            print(f'{"serialize csr " + encoding:<28} {len(body):>12,d} bytes {serialize:>9.3f} s')
+            print(f'{"gzip csr " + encoding:<28} {len(compressed):>12,d} bytes {compress:>9.3f} s')
+
+
+def time_deletes(app, db, args):
+    """Time void_movements, delete_movements and delete_locations on the seeded data"""
+    from db import delete_locations, delete_movements, void_movements
+
+    batch = min(5000, args.movements // 4)
+    with app.app_context():
+        start = time.perf_counter()
+        voided, skipped = void_movements([f'M-{n:08d}' for n in range(batch)])
+        db.session.commit()
+        print(f'{"void movements":<28} {voided:>6,d} ok {len(skipped):>6,d} skipped {time.perf_counter() - start:>9.3f} s')
+
+        start = time.perf_counter()
+        deleted = delete_movements([f'M-{n:08d}' for n in range(batch, 2 * batch)])
+        db.session.commit()
+        print(f'{"delete movements":<28} {deleted:>12,d} rows {time.perf_counter() - start:>9.3f} s')
+
+        start = time.perf_counter()
+        delete_locations(['LOC-00003'])
+        db.session.commit()
+        print(f'{"delete location":<28} {"":>17} {time.perf_counter() - start:>9.3f} s')
+
+
+def timed_get(client, url, headers=None):
+    start = time.perf_counter()
+    response = client.get(url, headers=headers or {})
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, (url, response.status_code)
+    return elapsed, len(response.get_data())
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from app import (app, db, User, Product, Location, ProductMovement,
+                     build_balance_matrix, encode_balance_matrix, MATRIX_DENSE_MAX_CELLS)
+    from db import get_stock_matrix
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench123')
+        db.session.add(user)
+        db.session.commit()
+        seed(db, Product, Location, ProductMovement, args)
+        user_id = str(user.id)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = user_id
+        sess['_fresh'] = True
+
+    print(f'{args.products} products x {args.locations} locations, {args.movements} movements')
+    time_phases(app, get_stock_matrix, build_balance_matrix, encode_balance_matrix)
+    print('end-to-end requests:')
+    cases = [
+        ('matrix csr json', '/api/balance/matrix', None),
+        ('matrix csr json gzip', '/api/balance/matrix', {'Accept-Encoding': 'gzip'}),
+        ('matrix csr binary', '/api/balance/matrix?encoding=binary', None),
+        ('matrix csr binary gzip', '/api/balance/matrix?encoding=binary', {'Accept-Encoding': 'gzip'}),
+    ]
+    if args.products * args.locations <= MATRIX_DENSE_MAX_CELLS:
+        cases.append(('matrix dense binary gzip', '/api/balance/matrix?layout=dense&encoding=binary',
+                      {'Accept-Encoding': 'gzip'}))
+    if not args.skip_html:
+        cases.append(('html report', '/balance', None))
+
+    for label, url, headers in cases:
+        elapsed, size = timed_get(client, url, headers)
+        print(f'{label:<28} {size:>12,d} bytes {elapsed:>9.3f} s')
+
+    if args.deletes:
+        print('set-based deletes:')
+        time_deletes(app, db, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Shared pytest fixtures; tests run against an in-memory database, not instance/inventory.db"""
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import pytest
+
+from app import app, db, init_sample_data
+
+
+@pytest.fixture(autouse=True)
+def fresh_db():
+    """Recreate the schema for every test"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def sample_data(fresh_db):
+    """Database loaded with the sample products, locations and movements"""
+    init_sample_data()
+    return fresh_db
+
+
+@pytest.fixture
+def client(sample_data):
+    """Test client logged in as the sample admin user"""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = '1'
+        sess['_fresh'] = True
+    return client
@@ -3,6 +3,8 @@ Database models for Inventory Management System
 """
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
@@ -83,20 +85,40 @@ class Location(db.Model):
         
         return total_in - total_out
     
+    def get_stock_query(self):
+        """Build a query for the net quantity of every product held at this location"""
+        signed_qty = db.case(
+            (ProductMovement.to_location == self.location_id, ProductMovement.qty),
+            else_=-ProductMovement.qty
+        )
+        qty = db.func.sum(signed_qty).label('qty')
+        return db.select(ProductMovement.product_id, qty).where(
+            db.or_(ProductMovement.to_location == self.location_id,
+                   ProductMovement.from_location == self.location_id)
+        ).group_by(ProductMovement.product_id).having(qty != 0)
+    
     def __repr__(self):
         return f'<Location {self.location_id}: {self.name}>'
 
 
+# Longest movement ID a user may enter; the VOID- prefix is reserved for
+# reversals recorded by void_movements, so the column has room for both.
+MOVEMENT_ID_LENGTH = 50
+VOID_PREFIX = 'VOID-'
+
+
 class ProductMovement(db.Model):
     """ProductMovement model for tracking stock movements"""
-    movement_id = db.Column(db.String(50), primary_key=True)
+    movement_id = db.Column(db.String(MOVEMENT_ID_LENGTH + len(VOID_PREFIX)), primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    from_location = db.Column(db.String(50), db.ForeignKey('location.location_id'), nullable=True)
-    to_location = db.Column(db.String(50), db.ForeignKey('location.location_id'), nullable=True)
-    product_id = db.Column(db.String(50), db.ForeignKey('product.product_id'), nullable=False)
+    from_location = db.Column(db.String(50), db.ForeignKey('location.location_id'), nullable=True, index=True)
+    to_location = db.Column(db.String(50), db.ForeignKey('location.location_id'), nullable=True, index=True)
+    product_id = db.Column(db.String(50), db.ForeignKey('product.product_id'), nullable=False, index=True)
     qty = db.Column(db.Integer, nullable=False)
     
-    # Relationships
+    # Relationships. No ON DELETE actions are declared: deleting products or
+    # locations must go through delete_products / delete_locations below,
+    # which also keep total_qty and the remaining balances consistent.
     product = db.relationship('Product', backref=db.backref('movements', lazy=True))
     from_loc = db.relationship('Location', foreign_keys=[from_location], backref=db.backref('movements_from', lazy=True))
     to_loc = db.relationship('Location', foreign_keys=[to_location], backref=db.backref('movements_to', lazy=True))
@@ -112,6 +134,12 @@ class ProductMovement(db.Model):
         else:
             return "Unknown"
     
+    def is_part_of_void(self):
+        """Check whether this is a void reversal or a movement that has been voided"""
+        if self.movement_id.startswith(VOID_PREFIX):
+            return True
+        return ProductMovement.query.get(VOID_PREFIX + self.movement_id) is not None
+    
     def validate_movement(self):
         """Validate if movement is possible (check stock availability)"""
         if self.from_location:
@@ -125,3 +153,260 @@ class ProductMovement(db.Model):
     
     def __repr__(self):
         return f'<Movement {self.movement_id}: {self.product_id} from {self.from_location} to {self.to_location}>'
+
+
+class TableVersion(db.Model):
+    """Per-table change counter, bumped on every flush that touches the table"""
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+
+# Tables whose changes are counted for ETag generation
+VERSIONED_TABLES = ('product', 'location', 'product_movement')
+
+
+def bump_table_versions(connection, table_names):
+    """Increment the change counter of each table, creating missing rows"""
+    versions = TableVersion.__table__
+    for table_name in table_names:
+        result = connection.execute(
+            versions.update()
+            .where(versions.c.table_name == table_name)
+            .values(version=versions.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(versions.insert().values(table_name=table_name, version=1))
+
+
+def get_table_versions(*table_names):
+    """Return {table_name: version} without reading the tables themselves"""
+    rows = db.session.execute(
+        db.select(TableVersion.table_name, TableVersion.version)
+        .where(TableVersion.table_name.in_(table_names))
+    ).all()
+    versions = dict.fromkeys(table_names, 0)
+    versions.update(rows)
+    return versions
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_table_changes(session, flush_context):
+    """Bump change counters for versioned tables written by this flush"""
+    changed = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is None or table.name not in VERSIONED_TABLES:
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        changed.add(table.name)
+    if changed:
+        bump_table_versions(session.connection(), sorted(changed))
+
+
+def get_stock_matrix():
+    """Aggregate net stock per (product, location).
+
+    The cells come from a single aggregate query over movements: each
+    movement contributes +qty to its to_location and -qty to its
+    from_location, the two legs are combined with UNION ALL and summed, so
+    zero and negative balances are returned as-is. The ordered ID vectors
+    are read with two further primary-key scans of product and location.
+    Returns (product_ids, location_ids, cells) where cells is a list of
+    (product_id, location_id, qty) tuples ordered by product then location.
+    """
+    inbound = db.select(
+        ProductMovement.product_id,
+        ProductMovement.to_location.label('location_id'),
+        ProductMovement.qty.label('qty')
+    ).where(ProductMovement.to_location != None)
+    outbound = db.select(
+        ProductMovement.product_id,
+        ProductMovement.from_location.label('location_id'),
+        (-ProductMovement.qty).label('qty')
+    ).where(ProductMovement.from_location != None)
+    legs = db.union_all(inbound, outbound).subquery()
+
+    # Run through the Core connection; ORM row processing dominates at ~1M cells
+    cells = db.session.connection().execute(
+        db.select(legs.c.product_id, legs.c.location_id, db.func.sum(legs.c.qty))
+        .group_by(legs.c.product_id, legs.c.location_id)
+        .order_by(legs.c.product_id, legs.c.location_id)
+    ).all()
+
+    product_ids = db.session.execute(
+        db.select(Product.product_id).order_by(Product.product_id)
+    ).scalars().all()
+    location_ids = db.session.execute(
+        db.select(Location.location_id).order_by(Location.location_id)
+    ).scalars().all()
+
+    return product_ids, location_ids, cells
+
+
+# Set-based deletes. These run as plain SQL statements inside the current
+# transaction without loading movements into the session; callers commit.
+# They are the only supported way to delete products, locations and movements.
+
+def _external_qty(from_missing, to_missing):
+    """A movement's contribution to Product.total_qty: +qty inbound, -qty outbound"""
+    return db.case(
+        (db.and_(from_missing, db.not_(to_missing)), ProductMovement.qty),
+        (db.and_(db.not_(from_missing), to_missing), -ProductMovement.qty),
+        else_=0
+    )
+
+
+def _adjust_total_qty(criteria, delta):
+    """Add the summed delta of the matching movements to each affected product's total_qty.
+
+    The per-product deltas are aggregated once and joined in with
+    UPDATE ... FROM, so the movement table is read a single time.
+    """
+    deltas = db.select(
+        ProductMovement.product_id,
+        db.func.sum(delta).label('delta')
+    ).where(criteria).group_by(ProductMovement.product_id).subquery()
+    db.session.execute(
+        db.update(Product)
+        .where(Product.product_id == deltas.c.product_id)
+        .values(total_qty=Product.total_qty + deltas.c.delta),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def _location_balances(pairs):
+    """Net quantity for each (product_id, location_id) pair, read through the movement indexes"""
+    pairs = list(pairs)
+    inbound = db.select(
+        ProductMovement.product_id,
+        ProductMovement.to_location.label('location_id'),
+        ProductMovement.qty.label('qty')
+    ).where(db.tuple_(ProductMovement.product_id, ProductMovement.to_location).in_(pairs))
+    outbound = db.select(
+        ProductMovement.product_id,
+        ProductMovement.from_location.label('location_id'),
+        (-ProductMovement.qty).label('qty')
+    ).where(db.tuple_(ProductMovement.product_id, ProductMovement.from_location).in_(pairs))
+    legs = db.union_all(inbound, outbound).subquery()
+    rows = db.session.execute(
+        db.select(legs.c.product_id, legs.c.location_id, db.func.sum(legs.c.qty))
+        .group_by(legs.c.product_id, legs.c.location_id)
+    ).all()
+    return {(product_id, location_id): qty for product_id, location_id, qty in rows}
+
+
+def _execute(statement):
+    return db.session.execute(statement, execution_options={'synchronize_session': False})
+
+
+def delete_products(product_ids):
+    """Delete products together with all of their movements. Returns rows deleted."""
+    product_ids = list(product_ids)
+    _execute(db.delete(ProductMovement).where(ProductMovement.product_id.in_(product_ids)))
+    deleted = _execute(db.delete(Product).where(Product.product_id.in_(product_ids))).rowcount
+    bump_table_versions(db.session.connection(), ['product', 'product_movement'])
+    return deleted
+
+
+def delete_locations(location_ids):
+    """Delete locations, detaching their movements.
+
+    Transfers into or out of a deleted location become outbound or inbound
+    movements of the remaining location, so every other location keeps its
+    balance. Movements left with neither location are removed, and product
+    total_qty is adjusted for the change in external in/out flow.
+    """
+    location_ids = list(location_ids)
+    from_gone = db.or_(ProductMovement.from_location == None, ProductMovement.from_location.in_(location_ids))
+    to_gone = db.or_(ProductMovement.to_location == None, ProductMovement.to_location.in_(location_ids))
+    touched = db.or_(ProductMovement.from_location.in_(location_ids), ProductMovement.to_location.in_(location_ids))
+
+    old_qty = _external_qty(ProductMovement.from_location == None, ProductMovement.to_location == None)
+    new_qty = _external_qty(from_gone, to_gone)
+    _adjust_total_qty(touched, new_qty - old_qty)
+
+    _execute(db.delete(ProductMovement).where(touched, from_gone, to_gone))
+    _execute(db.update(ProductMovement).where(ProductMovement.from_location.in_(location_ids)).values(from_location=None))
+    _execute(db.update(ProductMovement).where(ProductMovement.to_location.in_(location_ids)).values(to_location=None))
+    deleted = _execute(db.delete(Location).where(Location.location_id.in_(location_ids))).rowcount
+    bump_table_versions(db.session.connection(), ['location', 'product', 'product_movement'])
+    return deleted
+
+
+def delete_movements(movement_ids):
+    """Delete movements and back their effect out of product total_qty.
+
+    A voided movement and its VOID- reversal are always deleted together,
+    whichever of the two is named, so a void is never left half applied.
+    Returns rows deleted, including reversals.
+    """
+    movement_ids = set(movement_ids)
+    movement_ids |= {VOID_PREFIX + movement_id for movement_id in movement_ids
+                     if not movement_id.startswith(VOID_PREFIX)}
+    movement_ids |= {movement_id[len(VOID_PREFIX):] for movement_id in movement_ids
+                     if movement_id.startswith(VOID_PREFIX)}
+    matching = ProductMovement.movement_id.in_(movement_ids)
+    old_qty = _external_qty(ProductMovement.from_location == None, ProductMovement.to_location == None)
+    _adjust_total_qty(matching, -old_qty)
+    deleted = _execute(db.delete(ProductMovement).where(matching)).rowcount
+    bump_table_versions(db.session.connection(), ['product', 'product_movement'])
+    return deleted
+
+
+def void_movements(movement_ids):
+    """Void movements by recording a reversing movement for each one.
+
+    The original stays in the history; the reversal swaps from/to, is
+    stamped with the current time and gets the ID VOID-<movement_id>.
+    Void entries and already voided movements are ignored. Like
+    add_movement, a void may not overdraw a location: if reversing the
+    requested movements would leave a product's stock at their to_location
+    negative, all of those movements are skipped.
+    Returns (voided, skipped) where skipped lists the IDs refused for stock.
+    """
+    voids = db.aliased(ProductMovement)
+    void_id = db.literal(VOID_PREFIX) + ProductMovement.movement_id
+    candidates = db.session.execute(
+        db.select(ProductMovement.movement_id, ProductMovement.product_id,
+                  ProductMovement.to_location, ProductMovement.qty)
+        .where(ProductMovement.movement_id.in_(list(movement_ids)),
+               db.not_(ProductMovement.movement_id.startswith(VOID_PREFIX)),
+               ~db.exists().where(voids.movement_id == void_id))
+    ).all()
+
+    # Stock each (product, location) must give back if the voids go through
+    demand = {}
+    for _, product_id, to_location, qty in candidates:
+        if to_location is not None:
+            demand[(product_id, to_location)] = demand.get((product_id, to_location), 0) + qty
+    available = _location_balances(demand) if demand else {}
+    short = {key for key, qty in demand.items() if available.get(key, 0) < qty}
+
+    skipped = sorted(movement_id for movement_id, product_id, to_location, _ in candidates
+                     if (product_id, to_location) in short)
+    accepted = [movement_id for movement_id, product_id, to_location, _ in candidates
+                if (product_id, to_location) not in short]
+    if not accepted:
+        return 0, skipped
+
+    voidable = ProductMovement.movement_id.in_(accepted)
+    old_qty = _external_qty(ProductMovement.from_location == None, ProductMovement.to_location == None)
+    _adjust_total_qty(voidable, -old_qty)
+
+    reversals = db.select(
+        void_id,
+        db.literal(datetime.utcnow()),
+        ProductMovement.to_location,
+        ProductMovement.from_location,
+        ProductMovement.product_id,
+        ProductMovement.qty
+    ).where(voidable)
+    voided = _execute(
+        db.insert(ProductMovement).from_select(
+            ['movement_id', 'timestamp', 'from_location', 'to_location', 'product_id', 'qty'],
+            reversals
+        )
+    ).rowcount
+    bump_table_versions(db.session.connection(), ['product', 'product_movement'])
+    return voided, skipped
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Tests for the JSON read API and its ETag handling"""
+
+from app import db, ProductMovement
+from db import bump_table_versions, get_table_versions
+
+
+def get_with_etag(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_unchanged_resource_returns_304(client):
+    for url in ('/api/products', '/api/locations', '/api/movements', '/api/locations/WH-A/stock'):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert not response.headers['ETag'].startswith('W/')
+
+        cached = get_with_etag(client, url, response.headers['ETag'])
+        assert cached.status_code == 304
+        assert cached.data == b''
+
+
+def test_etag_depends_on_query(client):
+    first = client.get('/api/products?page=1&per_page=2').headers['ETag']
+    second = client.get('/api/products?page=2&per_page=2').headers['ETag']
+    assert first != second
+
+
+def test_orm_write_changes_etag(client):
+    products_etag = client.get('/api/products').headers['ETag']
+    stock_etag = client.get('/api/locations/WH-A/stock').headers['ETag']
+    locations_etag = client.get('/api/locations').headers['ETag']
+
+    client.post('/movements/add', data={'movement_id': 'MOV-100', 'from_location': '',
+                                        'to_location': 'WH-A', 'product_id': 'MOUSE-001', 'qty': '5'})
+
+    assert get_with_etag(client, '/api/products', products_etag).status_code == 200
+    assert get_with_etag(client, '/api/locations/WH-A/stock', stock_etag).status_code == 200
+    assert get_with_etag(client, '/api/locations', locations_etag).status_code == 304
+
+
+def test_core_write_changes_etag_only_when_bumped(client):
+    etag = client.get('/api/movements').headers['ETag']
+    statement = db.update(ProductMovement).where(ProductMovement.movement_id == 'MOV-001').values(qty=60)
+
+    db.session.execute(statement, execution_options={'synchronize_session': False})
+    db.session.commit()
+    assert get_with_etag(client, '/api/movements', etag).status_code == 304
+
+    before = get_table_versions('product_movement')['product_movement']
+    bump_table_versions(db.session.connection(), ['product_movement'])
+    db.session.commit()
+    assert get_table_versions('product_movement')['product_movement'] == before + 1
+    assert get_with_etag(client, '/api/movements', etag).status_code == 200
+
+
+def test_field_selection_and_pagination(client):
+    payload = client.get('/api/products?fields=product_id,total_qty&per_page=3&page=2').get_json()
+    assert payload['total'] == 4
+    assert payload['items'] == [{'product_id': 'MOUSE-001', 'total_qty': 135}]
+
+
+def test_location_stock_matches_other_listings(client):
+    payload = client.get('/api/locations/WH-A/stock?fields=qty&per_page=2').get_json()
+    assert payload['location_id'] == 'WH-A'
+    assert payload['total'] == 4
+    assert payload['items'] == [{'qty': 45}, {'qty': 10}]
+
+    assert client.get('/api/locations/NOPE/stock').status_code == 404
+    assert get_with_etag(client, '/api/locations/NOPE/stock', '*').status_code == 404
+
+
+def test_bad_field_selection(client):
+    empty = client.get('/api/products?fields=,')
+    assert empty.status_code == 400
+    assert 'at least one' in empty.get_json()['error']
+
+    unknown = client.get('/api/locations/WH-A/stock?fields=name')
+    assert unknown.status_code == 400
+    assert 'Unknown fields: name' in unknown.get_json()['error']
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Tests for fingerprinted static asset serving"""
+
+import re
+
+from assets import IMMUTABLE_CACHE_CONTROL
+
+
+def rendered_asset_urls(client):
+    html = client.get('/').get_data(as_text=True)
+    return re.findall(r'(?:href|src)="(/static/[^"]+)"', html)
+
+
+def test_base_template_links_hashed_assets(client):
+    urls = rendered_asset_urls(client)
+    assert len(urls) == 2
+    assert all(re.search(r'\.[0-9a-f]{12}\.(css|js)$', url) for url in urls)
+
+
+def test_hashed_asset_is_immutable_and_negotiated(client):
+    for url in rendered_asset_urls(client):
+        for accept, encoding in (('br, gzip', 'br'), ('gzip', 'gzip'), ('', None)):
+            response = client.get(url, headers={'Accept-Encoding': accept})
+            assert response.status_code == 200
+            assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+            assert response.headers.get('Content-Encoding') == encoding
+            assert 'Accept-Encoding' in response.headers['Vary']
+
+        etag = client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        assert client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304
+
+
+def test_unhashed_name_falls_back_to_default_handler(client):
+    response = client.get('/static/css/style.css')
+    assert response.status_code == 200
+    assert response.headers.get('Cache-Control') != IMMUTABLE_CACHE_CONTROL
+    assert 'Content-Encoding' not in response.headers
+    response.close()
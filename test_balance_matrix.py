@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Tests for the product x location balance matrix endpoint"""
+
+import gzip
+import json
+import struct
+
+import app as app_module
+from db import get_stock_matrix
+
+
+def decode_binary(body):
+    """Split a binary matrix body into its JSON header and integer arrays"""
+    (header_length,) = struct.unpack_from('<I', body)
+    header = json.loads(body[4:4 + header_length])
+    offset = 4 + header_length
+    arrays = {}
+    for spec in header['arrays']:
+        size = int(spec['dtype'][2:])
+        fmt = '<' + {2: 'h', 4: 'i', 8: 'q'}[size] * spec['length']
+        arrays[spec['name']] = list(struct.unpack_from(fmt, body, offset))
+        offset += size * spec['length']
+    assert offset == len(body)
+    return header, arrays
+
+
+def test_csr_matches_aggregate(client):
+    payload = client.get('/api/balance/matrix').get_json()
+    _, _, cells = get_stock_matrix()
+    expected = {(p, l): qty for p, l, qty in cells if qty}
+
+    found = {}
+    for row, product_id in enumerate(payload['products']):
+        for k in range(payload['indptr'][row], payload['indptr'][row + 1]):
+            found[(product_id, payload['locations'][payload['indices'][k]])] = payload['data'][k]
+    assert found == expected
+
+
+def test_binary_dense_gzip_round_trip(client):
+    response = client.get('/api/balance/matrix?layout=dense&encoding=binary',
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.mimetype == 'application/octet-stream'
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    header, arrays = decode_binary(gzip.decompress(response.data))
+    json_payload = client.get('/api/balance/matrix?layout=dense').get_json()
+    assert header['products'] == json_payload['products']
+    assert arrays['data'] == json_payload['data']
+
+
+def test_dense_layout_is_capped(client, monkeypatch):
+    def fail():
+        raise AssertionError('aggregate must not run for an oversized dense request')
+
+    monkeypatch.setattr(app_module, 'MATRIX_DENSE_MAX_CELLS', 15)
+    monkeypatch.setattr(app_module, 'get_stock_matrix', fail)
+    response = client.get('/api/balance/matrix?layout=dense')
+    assert response.status_code == 400
+    monkeypatch.undo()
+    assert client.get('/api/balance/matrix').status_code == 200
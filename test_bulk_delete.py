@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Tests for set-based deletes, voids and the bulk delete endpoints"""
+
+import pytest
+from sqlalchemy import event
+
+from app import db, Product, Location, ProductMovement
+from db import get_stock_matrix, delete_locations, delete_movements, delete_products, void_movements
+
+
+def balances():
+    """Non-zero {(product_id, location_id): qty} from the aggregate query"""
+    _, _, cells = get_stock_matrix()
+    return {(product_id, location_id): qty for product_id, location_id, qty in cells if qty}
+
+
+def assert_totals_consistent():
+    db.session.expire_all()
+    for product in Product.query.all():
+        assert product.total_qty == product.get_current_stock(), product.product_id
+
+
+def without_location(snapshot, location_ids):
+    return {key: qty for key, qty in snapshot.items() if key[1] not in location_ids}
+
+
+def test_delete_location_keeps_other_balances(client):
+    before = balances()
+    response = client.post('/api/locations/bulk-delete', json={'ids': ['WH-A']})
+    assert response.get_json() == {'deleted': 1}
+
+    assert Location.query.get('WH-A') is None
+    assert balances() == without_location(before, {'WH-A'})
+    assert ProductMovement.query.filter_by(from_location=None, to_location=None).count() == 0
+    assert_totals_consistent()
+
+
+def test_delete_both_ends_of_transfer(client):
+    before = balances()
+    transfers = ProductMovement.query.filter_by(from_location='WH-A', to_location='WH-B').count()
+    assert transfers > 0
+
+    response = client.post('/api/locations/bulk-delete', json={'ids': ['WH-A', 'WH-B']})
+    assert response.get_json() == {'deleted': 2}
+
+    assert balances() == without_location(before, {'WH-A', 'WH-B'})
+    assert ProductMovement.query.filter_by(from_location=None, to_location=None).count() == 0
+    assert ProductMovement.query.filter(ProductMovement.movement_id.in_(['MOV-005', 'MOV-001'])).count() == 0
+    assert_totals_consistent()
+
+
+def test_single_location_delete_route(client):
+    before = balances()
+    assert client.get('/locations/delete/STORE-1').status_code == 302
+    assert balances() == without_location(before, {'STORE-1'})
+    assert_totals_consistent()
+
+
+def test_delete_movements(client):
+    response = client.post('/api/movements/bulk-delete', json={'ids': ['MOV-002', 'MOV-006', 'MOV-017']})
+    assert response.get_json() == {'deleted': 3}
+    assert ProductMovement.query.count() == 18
+    assert_totals_consistent()
+
+
+def test_delete_products_removes_movements(client):
+    response = client.post('/api/products/bulk-delete', json={'ids': ['MOUSE-001', 'MISSING']})
+    assert response.get_json() == {'deleted': 1}
+    assert ProductMovement.query.filter_by(product_id='MOUSE-001').count() == 0
+    assert all(product_id != 'MOUSE-001' for product_id, _ in balances())
+    assert_totals_consistent()
+
+
+def void(client, *movement_ids):
+    return client.post('/api/movements/bulk-void', json={'ids': list(movement_ids)}).get_json()
+
+
+def test_void_reverses_movements(client):
+    before = balances()
+    voided = ['MOV-020', 'MOV-005', 'MOV-016']
+    assert void(client, *voided) == {'voided': 3, 'skipped': []}
+
+    expected = dict(before)
+    for movement in ProductMovement.query.filter(ProductMovement.movement_id.in_(voided)):
+        if movement.to_location:
+            key = (movement.product_id, movement.to_location)
+            expected[key] = expected.get(key, 0) - movement.qty
+        if movement.from_location:
+            key = (movement.product_id, movement.from_location)
+            expected[key] = expected.get(key, 0) + movement.qty
+    assert balances() == {key: qty for key, qty in expected.items() if qty}
+
+    reversal = ProductMovement.query.get('VOID-MOV-005')
+    assert (reversal.from_location, reversal.to_location) == ('WH-B', 'WH-A')
+    assert_totals_consistent()
+
+
+def test_void_that_would_overdraw_is_skipped(client):
+    # MOV-001 brought 50 laptops into WH-A, but only 10 are left there
+    before = balances()
+    assert void(client, 'MOV-001', 'MOV-016') == {'voided': 1, 'skipped': ['MOV-001']}
+    assert ProductMovement.query.get('VOID-MOV-001') is None
+    assert balances()[('LAPTOP-001', 'WH-A')] == before[('LAPTOP-001', 'WH-A')]
+    assert all(qty >= 0 for qty in balances().values())
+    assert_totals_consistent()
+
+
+def test_void_stock_check_covers_the_whole_batch(client):
+    # WH-B holds exactly 45 laptops, enough for MOV-005 (20) and MOV-020 (25) together
+    assert void(client, 'MOV-005', 'MOV-020') == {'voided': 2, 'skipped': []}
+    assert balances().get(('LAPTOP-001', 'WH-B'), 0) == 0
+
+
+def test_void_twice_is_a_no_op(client):
+    void(client, 'MOV-016')
+    after_first = balances()
+    count = ProductMovement.query.count()
+
+    assert void(client, 'MOV-016') == {'voided': 0, 'skipped': []}
+    assert ProductMovement.query.count() == count
+    assert balances() == after_first
+    assert_totals_consistent()
+
+
+def test_void_entries_cannot_be_voided(client):
+    void(client, 'MOV-016')
+    after_first = balances()
+
+    assert void(client, 'VOID-MOV-016') == {'voided': 0, 'skipped': []}
+    assert ProductMovement.query.get('VOID-VOID-MOV-016') is None
+    assert balances() == after_first
+    assert_totals_consistent()
+
+
+def test_void_prefix_is_reserved(client):
+    client.post('/movements/add', data={'movement_id': 'VOID-MOV-016', 'from_location': '',
+                                        'to_location': 'WH-A', 'product_id': 'MOUSE-001', 'qty': '5'})
+    assert ProductMovement.query.get('VOID-MOV-016') is None
+    assert void(client, 'MOV-016') == {'voided': 1, 'skipped': []}
+
+
+@pytest.mark.parametrize('named', ['MOV-016', 'VOID-MOV-016'])
+def test_deleting_either_half_of_a_void_deletes_both(client, named):
+    before = balances()
+    void(client, 'MOV-016')
+
+    response = client.post('/api/movements/bulk-delete', json={'ids': [named]})
+    assert response.get_json() == {'deleted': 2}
+    assert ProductMovement.query.filter(
+        ProductMovement.movement_id.in_(['MOV-016', 'VOID-MOV-016'])).count() == 0
+
+    # As if MOV-016 (8 laptops sold from STORE-1) had never been recorded
+    before[('LAPTOP-001', 'STORE-1')] += 8
+    assert balances() == before
+    assert_totals_consistent()
+
+
+@pytest.mark.parametrize('movement_id', ['MOV-016', 'VOID-MOV-016'])
+def test_void_pairs_cannot_be_edited(client, movement_id):
+    void(client, 'MOV-016')
+    before = balances()
+
+    client.post(f'/movements/edit/{movement_id}', data={'from_location': 'WH-A', 'to_location': '',
+                                                       'product_id': 'LAPTOP-001', 'qty': '1'})
+    assert balances() == before
+    assert client.get(f'/movements/edit/{movement_id}').status_code == 302
+
+
+def test_set_based_helpers_never_scan_movements(sample_data):
+    """Every statement touching product_movement must use an index, never a full scan"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'product_movement' in statement and not statement.startswith('EXPLAIN'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        void_movements(['MOV-016', 'MOV-005'])
+        delete_movements(['MOV-002', 'VOID-MOV-016'])
+        delete_locations(['WH-A'])
+        delete_products(['MOUSE-001'])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    connection = db.session.connection()
+    assert statements
+    for statement, parameters in statements:
+        plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        assert not any(step.startswith('SCAN product_movement') for step in plan), (statement, plan)
+        if statement.startswith('UPDATE product '):
+            # total_qty deltas are aggregated once, not re-queried per product
+            assert not any('CORRELATED' in step for step in plan), (statement, plan)
+    assert_totals_consistent()
+
+
+@pytest.mark.parametrize('url', ['/api/products/bulk-delete', '/api/locations/bulk-delete',
+                                 '/api/movements/bulk-delete', '/api/movements/bulk-void'])
+@pytest.mark.parametrize('body', [None, {}, {'ids': []}, {'ids': 'MOV-001'}, {'ids': [1, 2]}])
+def test_bad_body_is_rejected(client, url, body):
+    count = ProductMovement.query.count()
+    response = client.post(url, json=body) if body is not None else client.post(url, data='not json')
+    assert response.status_code == 400
+    assert 'ids' in response.get_json()['error']
+    assert ProductMovement.query.count() == count